@@ -1,13 +1,20 @@
 """AI analyzer module using LangChain with structured output."""
 
-from typing import Literal, get_type_hints
+import asyncio
+import functools
+import hashlib
+import json
+import warnings
+from typing import Any, Literal, Protocol, cast, get_args
 
+import orjson
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
-from pydantic import BaseModel, Field, create_model
+from pydantic import BaseModel, Field, ValidationError, create_model
 
+from cache import JsonFileCache
 from policy_mapping import get_policy_markdown
-from schema import POLICY_ITEMS
+from schema import POLICY_ITEMS, PolicyViolationAnalysis
 
 
 def create_policy_violation_analysis_model(
@@ -15,14 +22,22 @@ def create_policy_violation_analysis_model(
 ) -> type[BaseModel]:
     """Create a Pydantic model for policy violation analysis.
 
-    This function generates a new Pydantic model that includes three fields:
+    This function generates a new Pydantic model that includes these fields:
+    - `url`: The URL the analysis belongs to.
     - `violated_policy`: A field that must be one of the values in `policy_literals`.
     - `reason`: A field that must be a string.
     """
     return create_model(
         "PolicyViolationAnalysis",
+        url=(
+            str,
+            Field(
+                description="The URL of the analyzed website, exactly as given by the user",
+            ),
+        ),
         violated_policy=(
-            Literal[tuple(policy_literals)],
+            # Literal built at runtime from the selected policies
+            cast(Any, Literal)[tuple(policy_literals)],
             Field(
                 description=(
                     """
@@ -42,7 +57,9 @@ def create_policy_violation_analysis_model(
                     "You need to provide where they violated the policy in one sentence,"
                     "and description of it in another sentence, so 2 lines in total."
                 ),
-                example="The website is saying that they are selling CBD oils, but they are not licensed to sell CBD oils made from cannabis. This is against the policy of Legal requirements, because cannabis is a controlled substance in Japan, and thera are possibilities their cusomer abuse the product.",
+                examples=[
+                    "The website is saying that they are selling CBD oils, but they are not licensed to sell CBD oils made from cannabis. This is against the policy of Legal requirements, because cannabis is a controlled substance in Japan, and thera are possibilities their cusomer abuse the product.",
+                ],
             ),
         ),
         location_of_violation=(
@@ -73,32 +90,212 @@ def create_policy_violation_analysis_model(
                     "If an image is violated, return the container of the image. Do not return xpath to locate text only like /*[contains(text(), 'example text')]"
                     "Beware not to return too wide range xpath that includes too many elements."
                 ),
-                example="xpath=/html/body/div[1]/div[1]/div[1]",
+                examples=["xpath=/html/body/div[1]/div[1]/div[1]"],
             ),
         ),
     )
 
 
-RESPONSE_FORMAT = get_type_hints(create_policy_violation_analysis_model)["return"]
+def create_policy_violation_batch_model(
+    item_model: type[BaseModel],
+) -> type[BaseModel]:
+    """Create a Pydantic model wrapping one analysis per URL of a batch request."""
+    return create_model(
+        "PolicyViolationAnalysisBatch",
+        results=(
+            cast(Any, list)[item_model],
+            Field(
+                description=(
+                    "One analysis per URL given by the user, in the same order as the URLs."
+                ),
+            ),
+        ),
+    )
+
 
+@functools.lru_cache(maxsize=32)
+def _get_model(
+    policies_key: frozenset[str],
+) -> tuple[type[BaseModel], type[BaseModel], str]:
+    """Return the analysis model, batch model and batch JSON schema for a policy set
 
-def analyze_with_ai(
+    All of them are built only once per policy set.
+    """
+    item_cls = create_policy_violation_analysis_model(
+        [policy for policy in POLICY_ITEMS if policy in policies_key],
+    )
+    batch_cls = create_policy_violation_batch_model(item_cls)
+    schema_json = orjson.dumps(batch_cls.model_json_schema()).decode()
+    return item_cls, batch_cls, schema_json
+
+
+@functools.lru_cache(maxsize=32)
+def _build_policy_prompt(policies_key: frozenset[str]) -> str:
+    """Build the policy descriptions block of the system prompt for a policy set"""
+    policy_markdown = get_policy_markdown(
+        [policy for policy in POLICY_ITEMS if policy in policies_key],
+    )
+    policy_blocks = "".join(
+        f"""
+            <policy_name>{policy}</policy_name>
+            <policy_description>{markdown}</policy_description>
+            """
+        for policy, markdown in policy_markdown.items()
+    )
+    return f"<policies_description>{policy_blocks}</policies_description>"
+
+
+# Bump whenever the response schema or prompt changes so old answers are not reused
+LLM_CACHE_VERSION = 2
+# Cached answers expire so fixed websites are eventually re-analyzed
+LLM_CACHE_TTL = 7 * 24 * 60 * 60
+
+# Raw LLM responses keyed by `_cache_key`, shared across sessions
+_llm_cache = JsonFileCache(".llm_cache.json", ttl=LLM_CACHE_TTL)
+
+
+def _cache_key(
     url: str,
-    selected_policies: list[Literal[tuple(POLICY_ITEMS)]],
+    selected_policies: list[str],
+    model_name: str,
+    use_tools: bool,
+) -> str:
+    """Build the LLM response cache key for a request"""
+    payload = {
+        "version": LLM_CACHE_VERSION,
+        "url": url,
+        "policies": sorted(selected_policies),
+        "model": model_name,
+        "tools": use_tools,
+    }
+    return hashlib.sha256(json.dumps(payload).encode()).hexdigest()
+
+
+class _PolicyViolationBatch(Protocol):
+    """Fields of the batch model built by `create_policy_violation_batch_model`"""
+
+    results: list[PolicyViolationAnalysis]
+
+
+def _is_trusted(response_format: type[BaseModel], data: object) -> bool:
+    """Check that parsed JSON can be built without full validation
+
+    Every field must be present as a string, and `violated_policy` must be
+    one of the Literal values of the model.
+    """
+    if not isinstance(data, dict):
+        return False
+    fields = response_format.model_fields
+    if not all(isinstance(data.get(name), str) for name in fields):
+        return False
+    return data["violated_policy"] in get_args(fields["violated_policy"].annotation)
+
+
+def _parse_response(
+    response_format: type[BaseModel],
+    output_text: str | bytes,
+) -> PolicyViolationAnalysis:
+    """Parse the LLM output into the analysis model
+
+    Gemini already enforces `response_schema`, so a JSON object passing
+    `_is_trusted` is constructed without re-validation. Anything else falls
+    back to full validation so schema violations are still reported.
+    """
+    try:
+        data = orjson.loads(output_text)
+    except orjson.JSONDecodeError:
+        data = None
+    if _is_trusted(response_format, data):
+        return cast(PolicyViolationAnalysis, response_format.model_construct(**data))
+    return cast(
+        PolicyViolationAnalysis,
+        response_format.model_validate_json(output_text),
+    )
+
+
+def _parse_batch_response(
+    batch_format: type[BaseModel],
+    response_format: type[BaseModel],
+    output_text: str | bytes,
+) -> list[PolicyViolationAnalysis]:
+    """Parse a batch LLM output into a list of analysis models
+
+    Same fast path as `_parse_response`; `model_construct` does not build
+    nested models, so each item is constructed on its own. Items that fail
+    validation are dropped, which leaves their URL without an answer.
+    """
+    try:
+        data = orjson.loads(output_text)
+    except orjson.JSONDecodeError:
+        data = None
+    items = data.get("results") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        batch = cast(
+            _PolicyViolationBatch,
+            batch_format.model_validate_json(output_text),
+        )
+        return batch.results
+
+    results: list[PolicyViolationAnalysis] = []
+    for item in items:
+        if _is_trusted(response_format, item):
+            results.append(
+                cast(PolicyViolationAnalysis, response_format.model_construct(**item)),
+            )
+            continue
+        try:
+            results.append(
+                cast(PolicyViolationAnalysis, response_format.model_validate(item)),
+            )
+        except ValidationError as e:
+            warnings.warn(f"Dropping invalid analysis: {e!s}", stacklevel=2)
+    return results
+
+
+async def analyze_with_ai(
+    urls: list[str],
+    selected_policies: list[str],
     api_key: str,
     model_name: str,
-) -> RESPONSE_FORMAT:
-    """Analyze the website with AI and return the policy violation analysis."""
+    use_tools: bool = True,
+    refresh: bool = False,
+) -> list[PolicyViolationAnalysis | None]:
+    """Analyze the websites with AI and return one policy violation analysis per URL.
+
+    All URLs that are not cached yet are sent in a single request so the large
+    system prompt is shared. Results are returned in the order of `urls`, with
+    None for a URL the model returned no usable answer for.
+    `use_tools` binds Gemini's `url_context` tool, which is how the model reads
+    the pages; disable it only when the page content is provided another way.
+    `refresh` ignores cached answers and analyzes every URL again.
+    """
     try:
-        response_format = create_policy_violation_analysis_model(selected_policies)
-        policy_markdown = get_policy_markdown(selected_policies)
-        policy_prompt = "<policies_description>"
-        for policy, markdown in policy_markdown.items():
-            policy_prompt += f"""
-            <policy_name>{policy}</policy_name>
-            <policy_description>{markdown}</policy_description>
-            """
-        policy_prompt += "</policies_description>"
+        response_format, batch_format, schema_json = _get_model(
+            frozenset(selected_policies),
+        )
+
+        # Reuse previous answers for the same request without calling the LLM
+        analyses: dict[str, PolicyViolationAnalysis | None] = {}
+        for url in [] if refresh else dict.fromkeys(urls):
+            cached_output = _llm_cache.get(
+                _cache_key(url, selected_policies, model_name, use_tools),
+            )
+            if cached_output is None:
+                continue
+            try:
+                analyses[url] = _parse_response(response_format, cached_output)
+            except ValueError:
+                # Entry no longer matches the model, analyze the URL again
+                continue
+        missing = [url for url in dict.fromkeys(urls) if url not in analyses]
+        if not missing:
+            return [analyses[url] for url in urls]
+
+        # Blocking on a cold cache (policy pages download), so run it off the loop
+        policy_prompt = await asyncio.to_thread(
+            _build_policy_prompt,
+            frozenset(selected_policies),
+        )
 
         system_prompt = f"""
         You are an expert content policy analyzer. Analyze the provided website content
@@ -107,47 +304,66 @@ def analyze_with_ai(
         passed by url from user.
         Be thorough in your analysis and provide specific reasons for your findings.
         Provide your answer based only on the contents of the website from the url.
+        When several URLs are given, analyze each website independently.
 
         Always return output in the following format:
         <response_format>
-        {response_format.model_json_schema()}
+        {schema_json}
         </response_format>
 
         {policy_prompt}
         """
 
         user_prompt = f"""
-        Analyze the following website:
-        URL: {url}
-        Please analyze this website and find out where it violates any of the policies.
+        Analyze the following websites:
+        URLs: {orjson.dumps(missing).decode()}
+        Please analyze each website and find out where it violates any of the policies.
         Recommended approach:
-        1. Think carefully what the website is about and go through the page content.
+        1. Think carefully what each website is about and go through the page content.
         2. Find out the policy that is violated from the website content.
-        3. Return 'violated_policy' and 'reason' fields in the json object format.
+        3. Return one object per URL in 'results', in the same order as the URLs,
+           with 'url' set to the URL exactly as given.
         """
-        tools = []
-        if model_name.startswith("openai:"):
-            tools.append({"type": "web_search_preview"})
-        if model_name.startswith("gemini"):
-            tools.append({"url_context": {}})
-
         llm = ChatGoogleGenerativeAI(
             model=model_name,
             api_key=api_key,
-            response_schema=response_format.model_json_schema(),
+            # Fresh dict per call so the cached schema can never be mutated
+            response_schema=orjson.loads(schema_json),
             response_mime_type="application/json",
             thinking_budget=1024,
         )
-        llm_with_tools = llm.bind_tools(tools)
+        llm_with_tools = llm.bind_tools([{"url_context": {}}]) if use_tools else llm
 
-        result = llm_with_tools.invoke(
+        # Stream the answer and keep only the text parts (no thought blocks)
+        output = bytearray()
+        async for chunk in llm_with_tools.astream(
             [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)],
-        )
-        output_text = result.content[-1].get("text", "")
+        ):
+            output += chunk.text.encode()
+        output_text = bytes(output)
 
         try:
-            return response_format.model_validate_json(output_text)
+            results = _parse_batch_response(batch_format, response_format, output_text)
         except Exception as e:
             raise Exception(f"Error parsing response: {e!s}")
+
+        # Match answers by URL. Fall back to position only when every URL got an
+        # answer and that answer's URL does not belong to another input URL
+        by_url = {result.url: result for result in results}
+        positional = len(results) == len(missing)
+        new_entries: dict[str, str] = {}
+        for i, url in enumerate(missing):
+            analysis = by_url.get(url)
+            if analysis is not None:
+                new_entries[
+                    _cache_key(url, selected_policies, model_name, use_tools)
+                ] = orjson.dumps(analysis.model_dump()).decode()
+            elif positional and results[i].url not in missing:
+                # The model rewrote the URL; use the answer but never cache a guess
+                analysis = results[i]
+            analyses[url] = analysis
+        # One file write per batch, off the event loop
+        await asyncio.to_thread(_llm_cache.set_many, new_entries)
+        return [analyses[url] for url in urls]
     except Exception as e:
         raise Exception(f"AI analysis error: {e!s}")
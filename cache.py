@@ -0,0 +1,91 @@
+"""Small key-value cache persisted to a JSON file"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+class JsonFileCache:
+    """Thread-safe string cache kept in memory and mirrored to a JSON file
+
+    Values survive process restarts, so a cold start does not have to redo
+    work that an earlier session already paid for. Entries older than `ttl`
+    seconds are treated as missing and dropped on load and on every write;
+    without a `ttl` they never expire.
+    """
+
+    def __init__(self, path: str | Path, ttl: float | None = None) -> None:
+        self._path = Path(path)
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        # Entries are stored as [timestamp, value]
+        self._data: dict[str, list] = {}
+        try:
+            data = json.loads(self._path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            # Missing or corrupted cache file, start empty
+            data = {}
+        if isinstance(data, dict):
+            self._data = {
+                key: entry
+                for key, entry in data.items()
+                if isinstance(entry, list)
+                and len(entry) == 2
+                and isinstance(entry[0], (int, float))
+                and isinstance(entry[1], str)
+            }
+            self._drop_expired()
+
+    def _is_expired(self, stored_at: float, now: float) -> bool:
+        """Return whether an entry stored at `stored_at` is older than the ttl"""
+        return self._ttl is not None and now - stored_at > self._ttl
+
+    def _drop_expired(self) -> None:
+        """Remove expired entries so they are not written back to the file"""
+        if self._ttl is None:
+            return
+        now = time.time()
+        self._data = {
+            key: entry
+            for key, entry in self._data.items()
+            if not self._is_expired(entry[0], now)
+        }
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: str) -> str | None:
+        """Return the cached value, or None if it is missing or expired"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if self._is_expired(stored_at, time.time()):
+            return None
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """Store a value and write the cache file atomically"""
+        self.set_many({key: value})
+
+    def set_many(self, items: dict[str, str]) -> None:
+        """Store several values with a single write of the cache file"""
+        if not items:
+            return
+        stored_at = time.time()
+        with self._lock:
+            self._drop_expired()
+            for key, value in items.items():
+                self._data[key] = [stored_at, value]
+            tmp_path = self._path.with_suffix(self._path.suffix + ".tmp")
+            try:
+                tmp_path.write_text(
+                    json.dumps(self._data, ensure_ascii=False),
+                    encoding="utf-8",
+                )
+                os.replace(tmp_path, self._path)
+            except OSError:
+                # The in-memory copy still works on read-only file systems
+                pass
@@ -1,64 +1,282 @@
-import base64
+import asyncio
 import os
+import sys
+import tempfile
+import warnings
+from collections import Counter
+from collections.abc import Callable
 
 import streamlit as st
+from playwright.async_api import Page
 
 from ai_analyzer import analyze_with_ai
-from schema import MODEL_OPTIONS, POLICY_ITEMS
-from screen_shot import take_screenshot
-
-os.system("playwright install")
-os.system("playwright install-deps")
-
-
-def process_url(
-    url: str,
-    selected_policies: list[str],
-    api_key: str,
-    model_name: str,
-) -> dict:
-    """Process a single URL and return the result"""
-    result = {
+from schema import MODEL_OPTIONS, POLICY_ITEMS, PolicyViolationAnalysis, URLResult
+from screen_shot import BrowserPool, capture_xpath_screenshot, open_page
+
+# Playwright needs subprocess support, which only the Proactor loop has on Windows
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+
+# Marker file so the Playwright browser install only runs once per machine
+PLAYWRIGHT_SENTINEL = os.path.join(tempfile.gettempdir(), ".playwright_installed")
+
+# Only Chromium is used by screen_shot.py
+if (
+    not os.path.exists(PLAYWRIGHT_SENTINEL)
+    and os.system("playwright install chromium") == 0
+):
+    # System deps may already come from packages.txt, so do not require success
+    os.system("playwright install-deps chromium")
+    open(PLAYWRIGHT_SENTINEL, "w").close()
+
+# Maximum number of URL batches processed at the same time
+MAX_CONCURRENCY = 5
+# Number of URLs analyzed together in a single LLM request
+URL_BATCH_SIZE = 5
+# Maximum number of pages (one browser context each) loaded at the same time
+MAX_OPEN_PAGES = 2 * URL_BATCH_SIZE
+
+
+def _new_result(url: str) -> URLResult:
+    """Return the initial result of a URL"""
+    return {
         "url": url,
         "violated_policy": "Processing...",
         "reason": "",
         "location_of_violation": "",
-        "screenshot_base64": None,
+        "screenshot_bytes": None,
         "xpath": None,
+        "xpath_matched": False,
         "error": None,
     }
 
+
+def _set_error(result: URLResult, e: Exception) -> None:
+    """Mark a result as failed"""
+    result["error"] = str(e)
+    result["violated_policy"] = "Error"
+    result["reason"] = f"Processing error: {e!s}"
+
+
+async def process_url_async(
+    url: str,
+    analysis: PolicyViolationAnalysis,
+    page_task: asyncio.Task[Page],
+    pool: BrowserPool,
+) -> URLResult:
+    """Build the result of a single URL from its analysis and take the screenshot
+
+    `page_task` is the page navigation started before the analysis, so only
+    the element capture is left once the XPath is known.
+    """
+    result = _new_result(url)
+
+    try:
+        result["violated_policy"] = analysis.violated_policy
+        result["reason"] = analysis.reason
+        result["location_of_violation"] = analysis.location_of_violation
+        result["xpath"] = analysis.xpath
+
+        try:
+            page = await page_task
+        except Exception as e:
+            warnings.warn(f"Screenshot error for {url}: {e!s}", stacklevel=2)
+            result["error"] = "Failed to take screenshot"
+            return result
+
+        # Take screenshot (raw bytes are kept, st.image accepts them directly)
+        try:
+            screenshot_bytes, result["xpath_matched"] = await capture_xpath_screenshot(
+                page,
+                result["xpath"],
+            )
+            if screenshot_bytes:
+                result["screenshot_bytes"] = screenshot_bytes
+            else:
+                result["error"] = "Failed to take screenshot"
+        finally:
+            await pool.close_page(page)
+
+    except Exception as e:
+        _set_error(result, e)
+
+    return result
+
+
+async def _close_pages(
+    page_tasks: list[asyncio.Task[Page]],
+    pool: BrowserPool,
+) -> None:
+    """Close pages that were opened ahead of an analysis that failed
+
+    Each page is closed as soon as it is loaded, so its slot in the pool is
+    freed even while other pages of the batch still wait for one.
+    """
+
+    async def _close(page_task: asyncio.Task[Page]) -> None:
+        try:
+            page = await page_task
+        except Exception:
+            # Navigation failed, open_page already closed the page
+            return
+        await pool.close_page(page)
+
+    await asyncio.gather(*[_close(page_task) for page_task in page_tasks])
+
+
+async def process_batch_async(
+    urls: list[str],
+    selected_policies: list[str],
+    api_key: str,
+    model_name: str,
+    pool: BrowserPool,
+    on_done: Callable[[str], None],
+    refresh: bool = False,
+) -> list[URLResult]:
+    """Analyze a batch of URLs in one AI request, then screenshot each URL
+
+    Pages are loaded while the AI request is in flight, as far as the page
+    limit of `pool` allows. `refresh` ignores cached AI answers.
+    """
+    page_tasks = [asyncio.create_task(open_page(url, pool)) for url in urls]
     try:
         # Analyze with AI (get XPath first)
-        analysis = analyze_with_ai(
-            url,
+        analyses = await analyze_with_ai(
+            urls,
             selected_policies,
             api_key,
             model_name,
+            refresh=refresh,
         )
+    except Exception as e:
+        await _close_pages(page_tasks, pool)
+        results = []
+        for url in urls:
+            result = _new_result(url)
+            _set_error(result, e)
+            on_done(url)
+            results.append(result)
+        return results
+
+    async def _capture(
+        url: str,
+        analysis: PolicyViolationAnalysis | None,
+        page_task: asyncio.Task[Page],
+    ) -> URLResult:
+        if analysis is None:
+            # Only this URL failed, the rest of the batch keeps its answers
+            await _close_pages([page_task], pool)
+            result = _new_result(url)
+            _set_error(result, Exception("No analysis returned by the AI"))
+        else:
+            result = await process_url_async(url, analysis, page_task, pool)
+        on_done(url)
+        return result
+
+    return await asyncio.gather(
+        *[
+            _capture(url, analysis, page_task)
+            for url, analysis, page_task in zip(
+                urls,
+                analyses,
+                page_tasks,
+                strict=True,
+            )
+        ],
+    )
 
-        result["violated_policy"] = analysis.violated_policy
-        result["reason"] = analysis.reason
-        result["location_of_violation"] = getattr(
-            analysis,
-            "location_of_violation",
-            "",
-        )
-        result["xpath"] = getattr(analysis, "xpath", None)
 
-        # Take screenshot and encode as base64
-        screenshot_base64 = take_screenshot(url, result["xpath"])
-        if screenshot_base64:
-            result["screenshot_base64"] = screenshot_base64
-        else:
-            result["error"] = "Failed to take screenshot"
+async def _run_all(
+    urls: list[str],
+    selected_policies: list[str],
+    api_key: str,
+    model_name: str,
+    sem: asyncio.Semaphore,
+    on_done: Callable[[str], None],
+    refresh: bool = False,
+) -> list[URLResult]:
+    """Process all URLs in concurrent batches and return the results in input order
+
+    Repeated URLs are analyzed once, so two batches never send the same URL
+    to the AI at the same time.
+    """
+    unique_urls = list(dict.fromkeys(urls))
+    batches = [
+        unique_urls[i : i + URL_BATCH_SIZE]
+        for i in range(0, len(unique_urls), URL_BATCH_SIZE)
+    ]
+    occurrences = Counter(urls)
+
+    def _on_unique_done(url: str) -> None:
+        # Progress is counted per input line, duplicates included
+        for _ in range(occurrences[url]):
+            on_done(url)
+
+    async def _bounded(batch: list[str], pool: BrowserPool) -> list[URLResult]:
+        async with sem:
+            return await process_batch_async(
+                batch,
+                selected_policies,
+                api_key,
+                model_name,
+                pool,
+                _on_unique_done,
+                refresh=refresh,
+            )
 
+    # Launch the browser once and share it across every URL of the run
+    pool = BrowserPool(max_pages=MAX_OPEN_PAGES)
+    try:
+        await pool.start()
     except Exception as e:
-        result["error"] = str(e)
-        result["violated_policy"] = "Error"
-        result["reason"] = f"Processing error: {e!s}"
+        # Keep the AI analyses, each URL then reports its screenshot failure
+        warnings.warn(f"Failed to launch the browser: {e!s}", stacklevel=2)
+    try:
+        batch_results = await asyncio.gather(
+            *[_bounded(batch, pool) for batch in batches],
+        )
+    finally:
+        await pool.close()
+    results_by_url = {
+        result["url"]: result for results in batch_results for result in results
+    }
+    return [results_by_url[url].copy() for url in urls]
+
+
+def _parse_urls(url_input: str) -> list[str]:
+    """Split the URL text area into a list of URLs"""
+    return [url.strip() for url in url_input.split("\n") if url.strip()]
+
+
+def _keep_input_values() -> None:
+    """Pin the input values in session state before the widgets are created
+
+    Toggling `disabled` gives a widget a new identity, and Streamlit would
+    reset its value. Assigning the value back makes it survive the swap.
+    """
+    input_keys = ["api_key", "model_name", "refresh", "url_input"]
+    input_keys += [f"policy_{policy}" for policy in POLICY_ITEMS]
+    for key in input_keys:
+        if key in st.session_state:
+            st.session_state[key] = st.session_state[key]
 
-    return result
+
+def _start_analysis() -> None:
+    """Validate the inputs and flag the run as analyzing (analyze button callback)
+
+    Callbacks run before the script, so the inputs render disabled in the same
+    run and cannot trigger a rerun that would abort the analysis.
+    """
+    if not st.session_state.api_key:
+        error = "Please enter an API key"
+    elif not any(st.session_state[f"policy_{policy}"] for policy in POLICY_ITEMS):
+        error = "Please select at least one policy to check"
+    elif not _parse_urls(st.session_state.url_input):
+        error = "Please enter at least one URL"
+    else:
+        error = None
+    st.session_state.input_error = error
+    st.session_state.is_analyzing = error is None
 
 
 def main():
@@ -101,10 +319,15 @@ def main():
     if "results" not in st.session_state:
         st.session_state.results = []
 
-    # Initialize analyzing state
+    # Initialize analyzing state (set by the analyze button callback)
     if "is_analyzing" not in st.session_state:
         st.session_state.is_analyzing = False
 
+    # Set policies to be selected by default
+    for policy in POLICY_ITEMS:
+        st.session_state.setdefault(f"policy_{policy}", True)
+    _keep_input_values()
+
     # Settings section
     with st.sidebar:
         st.header("⚙️ Settings")
@@ -113,6 +336,7 @@ def main():
             "API Key",
             type="password",
             help="Enter your API key for the selected AI model",
+            key="api_key",
             disabled=st.session_state.is_analyzing,
         )
 
@@ -121,6 +345,15 @@ def main():
             options=MODEL_OPTIONS,
             index=0,
             help="Select the AI model to use (langchain literal format)",
+            key="model_name",
+            disabled=st.session_state.is_analyzing,
+        )
+
+        refresh = st.checkbox(
+            "Re-analyze cached URLs",
+            value=False,
+            help="Ignore saved AI results and analyze every URL again",
+            key="refresh",
             disabled=st.session_state.is_analyzing,
         )
 
@@ -130,12 +363,10 @@ def main():
         st.markdown("Select policies to check:")
 
         selected_policies = []
-        # Set checkboxes to be selected by default
         for policy in POLICY_ITEMS:
             if st.checkbox(
                 policy,
                 key=f"policy_{policy}",
-                value=True,
                 disabled=st.session_state.is_analyzing,
             ):
                 selected_policies.append(policy)
@@ -147,6 +378,7 @@ def main():
         "Enter URLs (one per line). You can enter the same URL multiple times.",
         height=150,
         help="Enter multiple URLs, one per line",
+        key="url_input",
         disabled=st.session_state.is_analyzing,
     )
 
@@ -154,77 +386,55 @@ def main():
         "🔄 Analyzing..." if st.session_state.is_analyzing else "🚀 Analyze URLs",
         type="primary",
         disabled=st.session_state.is_analyzing,
+        on_click=_start_analysis,
     )
-    if analyze_btn:
-        # Validation check
-        if not api_key:
-            st.error("Please enter an API key")
-            return
-
-        if not selected_policies:
-            st.error("Please select at least one policy to check")
-            return
-
-        if not url_input.strip():
-            st.error("Please enter at least one URL")
-            return
+    if analyze_btn and st.session_state.input_error:
+        st.error(st.session_state.input_error)
 
-        urls = [url.strip() for url in url_input.split("\n") if url.strip()]
-
-        if not urls:
-            st.error("No valid URLs found")
-            return
-
-        # Set processing state after validation passes
-        st.session_state.is_analyzing = True
-        # Save values to session state (for use after rerun)
-        st.session_state.url_input = url_input
-        st.session_state.api_key = api_key
-        st.session_state.selected_policies = selected_policies
-        st.session_state.model_name = model_name
-        st.session_state.urls = urls
-        # Rerun to update UI
-        st.rerun()
+    if st.session_state.is_analyzing:
+        urls = _parse_urls(url_input)
+        st.session_state.results = []
+        st.session_state.analysis_error = None
 
-    # Execute actual processing if analyzing
-    if st.session_state.is_analyzing and "urls" in st.session_state:
         try:
-            urls = st.session_state.urls
-            api_key = st.session_state.api_key
-            selected_policies = st.session_state.selected_policies
-            model_name = st.session_state.model_name
-
-            st.session_state.results = []
-
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-
-            for i, url in enumerate(urls):
-                status_text.text(f"Processing {i + 1}/{len(urls)}: {url}")
-                progress_bar.progress((i + 1) / len(urls))
-
-                result = process_url(
-                    url,
-                    selected_policies,
-                    api_key,
-                    model_name,
-                )
-                st.session_state.results.append(result)
-
-            status_text.text("✅ Analysis complete!")
-            progress_bar.empty()
-
-            # Clear session state after processing completes
-            if "urls" in st.session_state:
-                del st.session_state.urls
-
-        except Exception as e:
-            st.error(f"An error occurred during processing: {e!s}")
+            # Show progress inline, the inputs are already disabled for this run
+            with st.status(
+                f"Analyzing {len(urls)} URLs...",
+                expanded=True,
+            ) as status:
+                progress_bar = st.progress(0)
+                completed = 0
+
+                def on_done(url: str) -> None:
+                    nonlocal completed
+                    completed += 1
+                    status.update(label=f"Processed {completed}/{len(urls)}: {url}")
+                    progress_bar.progress(completed / len(urls))
+
+                try:
+                    st.session_state.results = asyncio.run(
+                        _run_all(
+                            urls,
+                            selected_policies,
+                            api_key,
+                            model_name,
+                            sem=asyncio.Semaphore(MAX_CONCURRENCY),
+                            on_done=on_done,
+                            refresh=refresh,
+                        ),
+                    )
+                except Exception as e:
+                    status.update(label="Analysis failed", state="error")
+                    st.session_state.analysis_error = (
+                        f"An error occurred during processing: {e!s}"
+                    )
         finally:
-            # Set is_analyzing to False after all processing completes
             st.session_state.is_analyzing = False
-            # Update UI to enable button
-            st.rerun()
+        # Render the inputs enabled again, results and errors are in session state
+        st.rerun()
+
+    if st.session_state.get("analysis_error"):
+        st.error(st.session_state.analysis_error)
 
     # Results display section
     if st.session_state.results:
@@ -269,14 +479,17 @@ def main():
                         st.write(result["location_of_violation"])
 
                     st.subheader("Screenshot")
-                    if result.get("screenshot_base64"):
+                    if result.get("screenshot_bytes") and not result.get(
+                        "xpath_matched",
+                    ):
+                        st.info(
+                            "The violation location could not be found on the page, "
+                            "showing the top of the page instead",
+                        )
+                    if result.get("screenshot_bytes"):
                         try:
-                            # Display image from base64 string
-                            screenshot_data = base64.b64decode(
-                                result["screenshot_base64"],
-                            )
                             st.image(
-                                screenshot_data,
+                                result["screenshot_bytes"],
                                 caption=result["url"],
                                 width="stretch",
                             )
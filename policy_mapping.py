@@ -1,8 +1,24 @@
 """Mapping of policy names to Google Ads policy URLs"""
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from bs4 import BeautifulSoup, SoupStrainer
 from html_to_markdown import convert_to_markdown
 
+from cache import JsonFileCache
+
+# Bump whenever the extraction changes so markdown of older versions is not reused
+POLICY_CACHE_VERSION = 2
+# Cached pages expire so updates to the Google policy text are picked up
+POLICY_CACHE_TTL = 24 * 60 * 60
+
+# Extracted policy markdown keyed by `_cache_key`, shared across sessions
+_markdown_cache = JsonFileCache(".policy_cache.json", ttl=POLICY_CACHE_TTL)
+# Serializes cold fetches so concurrent callers do not download the same pages
+_fetch_lock = threading.Lock()
+
 mapping_dict = {
     "Counterfeit goods": "https://support.google.com/adspolicy/answer/176017?sjid=16476839465041943591-NC",
     "Dangerous products or services": "https://support.google.com/adspolicy/answer/6014299?sjid=16476839465041943591-NC",
@@ -22,23 +38,73 @@ mapping_dict = {
 }
 
 
+def extract_article_html(html: str) -> str:
+    """Extract the policy article from the help page HTML
+
+    Only the <article> subtree is built, so navigation, footers and scripts
+    never reach the markdown conversion. Falls back to the whole page if the
+    layout changes.
+    """
+    soup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer("article"))
+    article = soup.find("article")
+    return str(article) if article is not None else html
+
+
 def extract_necessary_text(text: str) -> str:
     """Extract the necessary text from the policy markdown"""
-    text = text.split("#### On this page\n\n", 1)[1]
-    text = text.split("\n\n---\n\n\n", 1)[1]
+    _, found, body = text.partition("#### On this page\n\n")
+    if found:
+        # Skip the table of contents that follows the heading
+        text = body.split("\n\n---\n\n\n", 1)[-1]
     return text.split("Need help?")[0]
 
 
+def fetch_policy_markdown(url: str) -> str:
+    """Download a policy page and extract its markdown"""
+    response = requests.get(url, timeout=10)
+    response.raise_for_status()
+    article_html = extract_article_html(response.text)
+    return extract_necessary_text(convert_to_markdown(article_html))
+
+
+def _cache_key(url: str) -> str:
+    """Build the policy markdown cache key for a policy URL"""
+    return f"v{POLICY_CACHE_VERSION}:{url}"
+
+
 def get_policy_markdown(policies: list[str]) -> dict[str, str]:
-    """Get the markdown of the policies"""
-    output: dict[str, str] = {}
+    """Get the markdown of the policies
+
+    Pages are cached in memory and on disk for a day, and any missing pages are
+    downloaded in parallel.
+    """
     try:
-        for policy in policies:
-            url = mapping_dict[policy]
-            html = requests.get(url, timeout=10).text
-            markdown = convert_to_markdown(html)
-            output[policy] = extract_necessary_text(markdown)
+        urls = [mapping_dict[policy] for policy in policies]
+        missing = [
+            url for url in dict.fromkeys(urls) if _cache_key(url) not in _markdown_cache
+        ]
+        if missing:
+            with _fetch_lock:
+                missing = [
+                    url for url in missing if _cache_key(url) not in _markdown_cache
+                ]
+                with ThreadPoolExecutor(max_workers=8) as executor:
+                    fetched = dict(
+                        zip(
+                            missing,
+                            executor.map(fetch_policy_markdown, missing),
+                            strict=True,
+                        ),
+                    )
+                _markdown_cache.set_many(
+                    {_cache_key(url): markdown for url, markdown in fetched.items()},
+                )
+        output: dict[str, str] = {}
+        for policy, url in zip(policies, urls, strict=True):
+            markdown = _markdown_cache.get(_cache_key(url))
+            if markdown is None:
+                raise Exception(f"Policy page is not cached: {url}")
+            output[policy] = markdown
+        return output
     except Exception as e:
         raise Exception(f"Error getting policy markdown: {e!s}")
-    finally:
-        return output
@@ -1,5 +1,7 @@
 """Schema for the book building checker"""
 
+from typing import Any, Protocol, TypedDict
+
 # Policy items list
 POLICY_ITEMS = [
     "Counterfeit goods",
@@ -23,3 +25,28 @@ POLICY_ITEMS = [
 MODEL_OPTIONS = [
     "gemini-3-pro-preview",
 ]
+
+
+class URLResult(TypedDict):
+    """Result of a single URL, as stored in `st.session_state.results`"""
+
+    url: str
+    violated_policy: str
+    reason: str
+    location_of_violation: str
+    screenshot_bytes: bytes | None
+    xpath: str | None
+    xpath_matched: bool
+    error: str | None
+
+
+class PolicyViolationAnalysis(Protocol):
+    """Fields of the analysis model built by `ai_analyzer` for a single URL"""
+
+    url: str
+    violated_policy: str
+    reason: str
+    location_of_violation: str
+    xpath: str
+
+    def model_dump(self) -> dict[str, Any]: ...
@@ -1,97 +1,150 @@
-"""Take a screenshot of the website using Playwright's async API and return as base64 string."""
+"""Take a screenshot of the website using Playwright's async API and return as bytes."""
 
 import asyncio
-import base64
-import sys
 import warnings
+from typing import Self
 
-from playwright.async_api import async_playwright
+from playwright.async_api import (
+    Browser,
+    Page,
+    Playwright,
+    async_playwright,
+)
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
 
-async def take_xpath_screenshot(
-    url: str,
-    xpath: str | None = None,
-) -> bytes | None:
-    """Take a screenshot of a URL using Playwright's async API
+class BrowserPool:
+    """Single Chromium instance shared by all screenshots of a batch
 
-    Args:
-        url: URL to take screenshot of
-        xpath: XPath of a specific element (if specified, only that element is screenshot)
+    Use as an async context manager; each call to `get_page` opens a fresh,
+    isolated browser context so pages never share cookies or storage.
+    `max_pages` bounds how many pages are open at once, `get_page` waits for
+    a page to be released with `close_page` when the limit is reached.
+    """
 
-    Returns:
-        Byte data on success, None on failure
+    def __init__(self, max_pages: int | None = None) -> None:
+        self._pw: Playwright | None = None
+        self._browser: Browser | None = None
+        self._page_slots = asyncio.Semaphore(max_pages) if max_pages else None
+
+    async def __aenter__(self) -> Self:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        """Start Playwright and launch the shared browser"""
+        self._pw = await async_playwright().start()
+        try:
+            self._browser = await self._pw.chromium.launch(headless=True)
+        except Exception:
+            # Stop the Playwright driver so it does not outlive the event loop
+            await self.close()
+            raise
+
+    async def get_page(self) -> Page:
+        """Open a new page in its own browser context"""
+        if self._browser is None:
+            raise RuntimeError("BrowserPool is not started")
+        if self._page_slots is not None:
+            await self._page_slots.acquire()
+        try:
+            context = await self._browser.new_context()
+            return await context.new_page()
+        except BaseException:
+            self._release_slot()
+            raise
+
+    async def close_page(self, page: Page) -> None:
+        """Close a page from `get_page` together with its browser context
+
+        A failure to close is only warned about, so it never discards the
+        screenshot that was taken from the page.
+        """
+        try:
+            await page.context.close()
+        except Exception as e:
+            warnings.warn(f"Failed to close page {page.url}: {e!s}", stacklevel=2)
+        finally:
+            self._release_slot()
+
+    def _release_slot(self) -> None:
+        """Let a waiting `get_page` call open its page"""
+        if self._page_slots is not None:
+            self._page_slots.release()
 
+    async def close(self) -> None:
+        """Close the browser and stop Playwright"""
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._pw is not None:
+            await self._pw.stop()
+            self._pw = None
+
+
+async def _take_fallback_screenshot(page: Page) -> bytes:
+    """Take a compressed screenshot of the current viewport only
+
+    Full page PNGs of tall pages can reach several MB, so the fallback is
+    bounded to what the user would see first.
+    """
+    return await page.screenshot(full_page=False, type="jpeg", quality=70)
+
+
+async def open_page(url: str, pool: BrowserPool) -> Page:
+    """Open a URL in a new page of the pool and wait for it to load
+
+    The caller owns the page and must release it with `pool.close_page`.
     """
+    page = await pool.get_page()
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
-            await page.goto(url, wait_until="networkidle", timeout=30000)
-
-            screenshot_bytes = None
-            if xpath:
-                try:
-                    # Get element by XPath
-                    element = page.locator(f"xpath={xpath}").first
-                    count = await element.count()
-                    if count > 0:
-                        # Take screenshot of the element if it exists
-                        screenshot_bytes = await element.screenshot()
-                    else:
-                        # Take full page screenshot if element not found
-                        screenshot_bytes = await page.screenshot(full_page=True)
-                except Exception as e:
-                    # Take full page screenshot if XPath is invalid
-                    warnings.warn(
-                        f"XPath '{xpath}' is invalid or element not found. Taking full page screenshot: {e!s}",
-                        stacklevel=2,
-                    )
-                    screenshot_bytes = await page.screenshot(full_page=True)
-            else:
-                # Take full page screenshot if XPath is not specified
-                screenshot_bytes = await page.screenshot(full_page=True)
-
-            await browser.close()
-            return screenshot_bytes
-    except Exception as e:
-        warnings.warn(f"Screenshot error for {url}: {e!s}", stacklevel=2)
-        return None
+        await page.goto(url, wait_until="domcontentloaded", timeout=15000)
+        try:
+            # Give late content a short chance to settle; chatty pages never go idle
+            await page.wait_for_load_state("networkidle", timeout=3000)
+        except PlaywrightTimeoutError:
+            pass
+    except Exception:
+        await pool.close_page(page)
+        raise
+    return page
 
 
-def take_screenshot(url: str, xpath: str | None = None) -> str | None:
-    """Take a screenshot of a URL using Playwright and return as base64 encoded string (synchronous wrapper)
+async def capture_xpath_screenshot(
+    page: Page,
+    xpath: str | None = None,
+) -> tuple[bytes | None, bool]:
+    """Take a screenshot of an already loaded page
 
     Args:
-        url: URL to take screenshot of
+        page: Page opened by `open_page`
         xpath: XPath of a specific element (if specified, only that element is screenshot)
 
     Returns:
-        Base64 encoded string on success, None on failure
+        Tuple of the byte data (None on failure) and whether the XPath element
+        was captured. When it was not, the bytes are a viewport screenshot.
 
     """
-    # Event loop policy settings for Windows environment
-    if sys.platform == "win32":
-        old_policy = None
-        try:
-            old_policy = asyncio.get_event_loop_policy()
-            policy = asyncio.WindowsProactorEventLoopPolicy()
-            asyncio.set_event_loop_policy(policy)
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+    try:
+        if xpath:
             try:
-                screenshot_bytes = loop.run_until_complete(
-                    take_xpath_screenshot(url, xpath),
+                # Get element by XPath
+                element = page.locator(f"xpath={xpath}").first
+                count = await element.count()
+                if count > 0:
+                    # Take screenshot of the element if it exists
+                    return await element.screenshot(), True
+            except Exception as e:
+                warnings.warn(
+                    f"XPath '{xpath}' is invalid. Taking viewport screenshot: {e!s}",
+                    stacklevel=2,
                 )
-                if screenshot_bytes:
-                    return base64.b64encode(screenshot_bytes).decode("utf-8")
-                return None
-            finally:
-                loop.close()
-        finally:
-            if old_policy is not None:
-                asyncio.set_event_loop_policy(old_policy)
-    else:
-        screenshot_bytes = asyncio.run(take_xpath_screenshot(url, xpath))
-        if screenshot_bytes:
-            return base64.b64encode(screenshot_bytes).decode("utf-8")
-        return None
+
+        # Take viewport screenshot if XPath is not specified, invalid or not found
+        return await _take_fallback_screenshot(page), False
+    except Exception as e:
+        warnings.warn(f"Screenshot error for {page.url}: {e!s}", stacklevel=2)
+        return None, False
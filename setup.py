@@ -0,0 +1,20 @@
+"""Compile the analysis modules to C extensions with mypyc
+
+Optional, the app runs unchanged from the plain .py files. To build the
+extensions next to the sources (requires mypy and setuptools):
+
+    python setup.py build_ext --inplace
+
+Python then imports the compiled modules instead of the .py files. Delete
+the generated *.so / *.pyd files to go back to the interpreted modules.
+"""
+
+from mypyc.build import mypycify
+from setuptools import setup  # type: ignore[import-untyped, import-not-found]
+
+setup(
+    name="book-buliding-checker",
+    # Only the extensions are built, the app itself is not packaged
+    py_modules=[],
+    ext_modules=mypycify(["ai_analyzer.py", "policy_mapping.py"]),
+)